@@ -3,7 +3,7 @@ import logging
 import traceback
 
 from .rpc_wrapper import RPCWrapper
-from .outputter import print_output, print_text
+from .outputter import print_output, print_text, mark_event_dirty
 
 logger = logging.getLogger('status')
 LIMIT = 1024 * 1024  # 1 MiB
@@ -17,6 +17,7 @@ class Status:
         if request.method != 'event':
             logger.warn(f'Unexpected request: {request.serialize()}')
             return
+        mark_event_dirty(rpc, request.kwargs.get('event', None))
         await print_output(rpc, self.max_output_length)
 
     async def output_loop(self, rpc):
@@ -39,6 +39,9 @@ volume_module = AutoHideModule('[ {}%]', timeout=5)
 player_name_module = AutoHideModule('[{}]', '[{}]', timeout=5)
 
 
+# ljust_clip, get_position_info's fmt and get_trackname are mirrored in
+# playerctlctl/formatter.py for daemon-rendered lines, change them together
+
 def ljust_clip(string, n):
     if len(string) > n:
         return string[:n-3] + '...'
@@ -80,33 +83,63 @@ def get_trackname(metadata):
     return f'{artist} - {title}'
 
 
+# Which cached requests each event makes stale,
+# events that aren't listed here make everything stale (ie a player change)
+EVENT_DIRTY_METHODS = {
+    'metadata': ('get_all_metadata',),
+    'playback-status': ('get_status',),
+    'volume': ('get_volume',),
+    'seeked': (),
+    'loop-status': (),
+    'shuffle': (),
+}
+
+
+def mark_event_dirty(rpc, event):
+    methods = EVENT_DIRTY_METHODS.get(event, None)
+    if methods is None:
+        rpc.mark_dirty()
+        return
+    if methods:
+        rpc.mark_dirty(*methods)
+
+
 async def get_output(rpc, max_length):
-    player_instance = await rpc.do_request('ctl_get_instance')
+    player_instance, player_name = await rpc.do_cached_requests(
+        'ctl_get_instance', 'ctl_get_name'
+    )
     if not player_instance:
         return ' ' * max_length
 
-    output = ''
-    metadata = await rpc.do_request('get_all_metadata')
-    try:
-        position = await rpc.do_request('get_position')
-    except RPCError:
+    # The position changes continuously, so it's always fetched
+    rpc.mark_dirty('get_position')
+    metadata, status, volume, position = await rpc.do_cached_requests(
+        'get_all_metadata', 'get_status', 'get_volume', 'get_position',
+        return_exceptions=True
+    )
+    for result in (metadata, status, volume):
+        if isinstance(result, Exception):
+            raise result
+    if isinstance(position, RPCError):
         position = None
+    elif isinstance(position, Exception):
+        raise position
+
+    output = ''
     position_str, percent = get_position_info(position, metadata)
 
     # Status icon
-    output += STATUS_ICONS.get(await rpc.do_request('get_status'), '')
+    output += STATUS_ICONS.get(status, '')
     output += ' '
 
     # Player name
-    player_name = await rpc.do_request('ctl_get_name')
     output += player_name_module.get_output(player_instance, player_name)
 
     # Position
     output += f'[{position_str}]'
 
     # Volume
-    volume = round(await rpc.do_request('get_volume') * 100)
-    output += volume_module.get_output(volume)
+    output += volume_module.get_output(round(volume * 100))
 
     # Track name
     output += ' ' + get_trackname(metadata)
@@ -20,23 +20,102 @@ class RPCWrapper:
         self.writer = writer
         self.pending_requests = {}
         self.callbacks_queue = asyncio.Queue()
+        # Results of argumentless requests, keyed by method name
+        self.cache = {}
+        self.dirty = set()
+        # Bumped when everything is marked stale, results of requests
+        # sent before that are not cached
+        self.generation = 0
+
+    async def wait_reply(self, req, fut):
+        ret = await asyncio.wait_for(fut, 5)
+        if hasattr(ret, 'error'):
+            raise RPCError(ret.error)
+        return ret.result
+
+    async def send_requests(self, reqs, return_exceptions=False):
+        # Put futures in dict before sending so a fast reply can't arrive before them
+        loop = asyncio.get_running_loop()
+        futs = []
+        for req in reqs:
+            fut = loop.create_future()
+            self.pending_requests[req.unique_id] = fut
+            futs.append(fut)
+
+        try:
+            for req in reqs:
+                logger.debug(f'Sending msg #{req.unique_id}: {req.serialize()}')
+                self.writer.write(req.serialize())
+                self.writer.write(b'\n')
+            await self.writer.drain()
+
+            return await asyncio.gather(
+                *(self.wait_reply(req, fut) for req, fut in zip(reqs, futs)),
+                return_exceptions=return_exceptions
+            )
+        finally:
+            # Clean up after requests that timed out or failed to send
+            for req in reqs:
+                self.pending_requests.pop(req.unique_id, None)
 
     async def do_request(self, method, args=None, kwargs=None, one_way=False):
         req = rpc.create_request(method, args=args, kwargs=kwargs, one_way=one_way)
+        if one_way:
+            logger.debug(f'Sending msg: {req.serialize()}')
+            self.writer.write(req.serialize())
+            self.writer.write(b'\n')
+            await self.writer.drain()
+            return None
 
-        logger.debug(f'Sending msg #{req.unique_id}: {req.serialize()}')
-        self.writer.write(req.serialize())
-        self.writer.write(b'\n')
-        await self.writer.drain()
+        ret, = await self.send_requests([req])
+        return ret
 
-        # Put future in dict so we can set the result when the response comes back
-        fut = asyncio.Future()
-        self.pending_requests[req.unique_id] = fut
+    async def do_requests(self, *methods, return_exceptions=False):
+        """
+        Sends argumentless requests together and returns their results in order
+        """
+        reqs = [rpc.create_request(method) for method in methods]
+        return await self.send_requests(reqs, return_exceptions)
 
-        ret = await asyncio.wait_for(fut, 5)
-        if hasattr(ret, 'error'):
-            raise RPCError(ret.error)
-        return ret.result
+    def mark_dirty(self, *methods):
+        """
+        Marks the results of methods as stale, or all results if none are given
+        """
+        if not methods:
+            self.cache.clear()
+            self.generation += 1
+            return
+        self.dirty.update(methods)
+
+    async def do_cached_requests(self, *methods, return_exceptions=False):
+        """
+        Like do_requests, but only sends the requests whose results
+        are not cached or have been marked dirty
+        """
+        stale = [m for m in methods if m in self.dirty or m not in self.cache]
+        cached = {m: self.cache[m] for m in methods if m not in stale}
+        generation = self.generation
+        # Clear dirty flags before sending, so events that arrive while we wait
+        # mark the results dirty again (or bump the generation if they mark
+        # everything dirty)
+        self.dirty.difference_update(stale)
+
+        try:
+            results = await self.do_requests(*stale, return_exceptions=return_exceptions)
+        except Exception:
+            self.dirty.update(stale)
+            raise
+
+        if generation == self.generation:
+            for method, result in zip(stale, results):
+                if isinstance(result, Exception):
+                    self.cache.pop(method, None)
+                    self.dirty.add(method)
+                else:
+                    self.cache[method] = result
+
+        fresh = dict(zip(stale, results))
+        return [fresh[m] if m in fresh else cached[m] for m in methods]
 
     async def callbacks_loop(self):
         while 1:
@@ -58,13 +137,13 @@ class RPCWrapper:
                 request = rpc.parse_request(msg)
                 self.callbacks_queue.put_nowait(request_handler(self, request))
                 return
-            fut = self.pending_requests.get(reply.unique_id, None)
+            fut = self.pending_requests.pop(reply.unique_id, None)
             if not fut:
                 logger.warn(f'Unexpected reply: {msg}')
                 return
             logger.debug(f'Got reply to #{reply.unique_id}: {msg}')
-            fut.set_result(reply)
-            del self.pending_requests[reply.unique_id]
+            if not fut.done():
+                fut.set_result(reply)
         except Exception as e:
             logger.warn(f'Unexpected exception in rpc loop: {e}')
             logger.warn(traceback.format_exc())
@@ -9,15 +9,17 @@ __version__ = '0.2.0'
 import os
 import asyncio
 import inspect
-import concurrent.futures
+import threading
 import logging
 
 from tinyrpc.protocols.jsonrpc import JSONRPCProtocol
 from tinyrpc import MethodNotFoundError, BadRequestError, InvalidParamsError
 
-from .core import Core
-from .utils import on_exception, are_params_valid
+from .core import Core, CALL_TIMEOUT, TRIP_THRESHOLD, PROBE_INTERVAL
+from .utils import on_exception, are_params_valid, get_player_instance
 from .commands import Commands
+from .coalesce import PendingAdjustments
+from .formatter import FormatSubscriptions, get_state, STATE_EVENTS
 
 
 logger = logging.getLogger('daemon')
@@ -25,36 +27,80 @@ rpc = JSONRPCProtocol()
 
 
 class Daemon:
-    def __init__(self, socket_path):
+    def __init__(
+        self,
+        socket_path,
+        call_timeout=CALL_TIMEOUT,
+        trip_threshold=TRIP_THRESHOLD,
+        probe_interval=PROBE_INTERVAL,
+        trace_recorder=None
+    ):
         self.socket_path = socket_path
+        self.call_timeout = call_timeout
+        self.trip_threshold = trip_threshold
+        self.probe_interval = probe_interval
+        self.trace_recorder = trace_recorder
         self.event_loop = None
         self.core = None
-        self.event_queue = None
+        self.event_batch = []
+        self.event_batch_lock = threading.Lock()
+        self.event_batch_ready = None
+        self.wakeup_pending = False
+        self.events_published = 0
+        self.event_wakeups = 0
         self.event_listeners = set()
+        self.adjustments = None
+        self.formats = FormatSubscriptions(lambda: get_state(Commands(self)))
 
     def publish_event(self, event, **kwargs):
-        self.event_loop.call_soon_threadsafe(
-            lambda: self.event_queue.put_nowait((event, kwargs))
+        # Events arrive in bursts from the GLib thread, so only wake the
+        # asyncio loop for the first event of each batch
+        with self.event_batch_lock:
+            self.event_batch.append((event, kwargs))
+            self.events_published += 1
+            if self.wakeup_pending:
+                return
+            self.wakeup_pending = True
+            self.event_wakeups += 1
+        self.event_loop.call_soon_threadsafe(self.event_batch_ready.set)
+
+    async def publish_to_listeners(self, event, kwargs):
+        logger.debug(f'Publishing event: {event}={kwargs}')
+
+        listener_statuses = await asyncio.gather(
+            *(listener(event, **kwargs) for listener in self.event_listeners)
         )
 
-    async def event_publisher_loop(self):
-        while 1:
-            event, kwargs = await self.event_queue.get()
-            logger.debug(f'Publishing event: {event}={kwargs}')
+        stale_listeners = {
+            listener
+            for listener, is_valid in zip(self.event_listeners, listener_statuses)
+            if not is_valid
+        }
 
-            listener_statuses = await asyncio.gather(
-                *(listener(event, **kwargs) for listener in self.event_listeners)
-            )
+        self.event_listeners = self.event_listeners - stale_listeners
+        if stale_listeners:
+            logger.debug(f'Removed {len(stale_listeners)} stale listener(s)')
 
-            stale_listeners = {
-                listener
-                for listener, is_valid in zip(self.event_listeners, listener_statuses)
-                if not is_valid
-            }
-
-            self.event_listeners = self.event_listeners - stale_listeners
-            if stale_listeners:
-                logger.debug(f'Removed {len(stale_listeners)} stale listener(s)')
+    async def event_publisher_loop(self):
+        while 1:
+            await self.event_batch_ready.wait()
+            self.event_batch_ready.clear()
+            with self.event_batch_lock:
+                batch, self.event_batch = self.event_batch, []
+                self.wakeup_pending = False
+
+            # Player events are only sent for the current player
+            instance = get_player_instance(self.core.current_player)
+            for event, kwargs in batch:
+                self.adjustments.on_player_event(instance, event)
+                await self.publish_to_listeners(event, kwargs)
+            # Render once for the whole batch, if anything in it can change a line
+            if not any(event in STATE_EVENTS for event, _ in batch):
+                continue
+            try:
+                await self.formats.publish()
+            except Exception as e:
+                logger.warning(f'Failed to publish formatted lines: {e}')
 
     @on_exception(lambda e, self, req, send_event: req.error_respond(e))
     def handle_socket_req(self, req, send_event):
@@ -65,10 +111,12 @@ class Daemon:
             namespace, method = '', req.method
 
         # Commands will be run on the current (asyncio) thread,
-        # this is not correct, but it will work since
-        # we do not block anywhere in the Core class or the publish event method
+        # this is not correct, but it mostly works since
+        # we do not block anywhere in the Core class or the publish event method.
+        # Calls to the player do block this thread, for up to the core's call
+        # timeout each, until the player is marked as unresponsive
         obj = {
-            'player': self.core.current_player,
+            'player': self.core.guard_player(self.core.current_player),
             '': Commands(self, send_event)
         }.get(namespace, None)
 
@@ -94,19 +142,23 @@ class Daemon:
                 return False
             return True
 
-        while 1:
-            msg = await reader.readline()
-            if not msg:
-                break
-            try:
-                req = rpc.parse_request(msg)
-            except BadRequestError as e:
-                res = e.error_respond()
-            else:
-                res = self.handle_socket_req(req, send_event)
-            writer.write(res.serialize())
-            writer.write(b'\n')
-            await writer.drain()
+        try:
+            while 1:
+                msg = await reader.readline()
+                if not msg:
+                    break
+                try:
+                    req = rpc.parse_request(msg)
+                except BadRequestError as e:
+                    res = e.error_respond()
+                else:
+                    res = self.handle_socket_req(req, send_event)
+                writer.write(res.serialize())
+                writer.write(b'\n')
+                await writer.drain()
+        finally:
+            # Format groups only notice dead listeners when their line changes
+            self.formats.unsubscribe(send_event)
 
     async def handle_socket(self, reader, writer):
         try:
@@ -126,19 +178,34 @@ class Daemon:
                 'An instance of playerctlctl seems to already be running for this user'
             )
 
-    async def run(self):
+    def setup(self):
+        """
+        Creates the core and the state that depends on the running event loop,
+        without starting the core or the server
+        """
         self.event_loop = asyncio.get_running_loop()
-        self.event_queue = asyncio.Queue()
+        self.event_batch_ready = asyncio.Event()
+        self.adjustments = PendingAdjustments(self.event_loop)
+        self.core = Core(
+            self.publish_event,
+            call_timeout=self.call_timeout,
+            trip_threshold=self.trip_threshold,
+            probe_interval=self.probe_interval,
+            trace_recorder=self.trace_recorder
+        )
+
+    async def run(self):
+        self.setup()
         await self.check_socket()
 
-        self.core = Core(self.publish_event)
-        pool = concurrent.futures.ThreadPoolExecutor()
-        self.event_loop.run_in_executor(pool, self.core.run)
+        threading.Thread(target=self.core.run, name='glib', daemon=True).start()
 
         event_publisher = asyncio.create_task(self.event_publisher_loop())
+        format_refresher = asyncio.create_task(self.formats.refresh_loop())
         server = await asyncio.start_unix_server(self.handle_socket, self.socket_path)
         try:
             async with server:
                 await server.serve_forever()
         finally:
-            event_publisher.cancel()
\ No newline at end of file
+            event_publisher.cancel()
+            format_refresher.cancel()
\ No newline at end of file
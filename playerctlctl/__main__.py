@@ -3,9 +3,23 @@ import logging
 import os
 
 from . import Daemon
+from .trace import TraceRecorder
 
 
 logging.basicConfig(level=logging.INFO)
 
 socket_path = os.path.join(os.environ["XDG_RUNTIME_DIR"], 'playerctlctl')
-asyncio.run(Daemon(socket_path).run())
\ No newline at end of file
+call_timeout = float(os.environ.get('PLAYERCTLCTL_CALL_TIMEOUT', 1))
+# Set PLAYERCTLCTL_TRACE to a path to record received signals for replaying
+trace_path = os.environ.get('PLAYERCTLCTL_TRACE', None)
+trace_recorder = TraceRecorder(trace_path) if trace_path else None
+
+try:
+    asyncio.run(Daemon(
+        socket_path,
+        call_timeout=call_timeout,
+        trace_recorder=trace_recorder
+    ).run())
+finally:
+    if trace_recorder:
+        trace_recorder.close()
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+A daemon to make controlling multiple players easier.
+
+Merges bursts of relative adjustments (ie from a held volume/seek hotkey)
+into a single absolute write per window
+"""
+
+import logging
+
+logger = logging.getLogger('coalesce')
+
+# Seconds to collect relative adjustments for before writing them to the player
+COALESCE_WINDOW = 0.05
+# Seconds after a write during which the written value is used as the base for
+# the next adjustment, since the player may not have reported the new value yet
+SETTLE_TIME = 0.5
+
+# Which adjustment kind each player event makes stale
+EVENT_ADJUSTMENT_KINDS = {
+    'metadata': 'position',
+    'seeked': 'position',
+    'volume': 'volume',
+}
+
+
+class Adjustment:
+    def __init__(self, target, rate, maximum, now):
+        self.target = target
+        # How much the value changes by itself per second (ie the position while playing)
+        self.rate = rate
+        self.maximum = maximum
+        self.updated_at = now
+        self.handle = None
+        self.written_at = None
+
+    def advance(self, now):
+        self.target += self.rate * (now - self.updated_at)
+        self.updated_at = now
+        self.clamp()
+
+    def clamp(self):
+        if self.maximum is not None:
+            self.target = min(self.target, self.maximum)
+
+
+class PendingAdjustments:
+    def __init__(self, event_loop, window=COALESCE_WINDOW, settle_time=SETTLE_TIME):
+        self.event_loop = event_loop
+        self.window = window
+        self.settle_time = settle_time
+        self.adjustments = {}
+
+    def is_live(self, adjustment):
+        if adjustment.handle is not None:
+            return True
+        return self.event_loop.time() - adjustment.written_at <= self.settle_time
+
+    def get(self, key):
+        """
+        Gets the target of a pending or just written adjustment, or None
+        """
+        adjustment = self.adjustments.get(key, None)
+        if adjustment and self.is_live(adjustment):
+            adjustment.advance(self.event_loop.time())
+            return adjustment.target
+        return None
+
+    def adjust(
+        self, key, delta, read, write,
+        minimum=None, read_rate=None, read_maximum=None
+    ):
+        """
+        Shifts the target for key by delta and returns the new target
+
+        read -- called to get the current value if nothing is pending
+        write -- called once at the end of the window with the final target
+        minimum -- the lowest value the target can be set to
+        read_rate -- called with read to get how much the value changes by
+            itself per second, the target is moved along at this rate
+        read_maximum -- called with read to get the highest value the target
+            can be set to, or None if there isn't one
+        """
+        now = self.event_loop.time()
+        adjustment = self.adjustments.get(key, None)
+        if not adjustment or not self.is_live(adjustment):
+            rate = read_rate() if read_rate else 0
+            maximum = read_maximum() if read_maximum else None
+            adjustment = Adjustment(read(), rate, maximum, now)
+            self.adjustments[key] = adjustment
+        adjustment.advance(now)
+
+        adjustment.target += delta
+        adjustment.clamp()
+        if minimum is not None:
+            adjustment.target = max(adjustment.target, minimum)
+
+        if adjustment.handle is None:
+            adjustment.handle = self.event_loop.call_later(
+                self.window, self.flush, key, adjustment, write
+            )
+        return adjustment.target
+
+    def flush(self, key, adjustment, write):
+        adjustment.handle = None
+        adjustment.written_at = self.event_loop.time()
+        adjustment.advance(adjustment.written_at)
+        try:
+            write(adjustment.target)
+        except Exception as e:
+            logger.warning(f'Failed to apply adjustment {key}={adjustment.target}: {e}')
+            if self.adjustments.get(key, None) is adjustment:
+                del self.adjustments[key]
+
+    def on_player_event(self, instance, event):
+        """
+        Drops a written adjustment once the player reports a value of its own,
+        pending ones are kept since the event may just be the echo of an
+        earlier write in the same burst
+        """
+        kind = EVENT_ADJUSTMENT_KINDS.get(event, None)
+        if not kind:
+            return
+        key = (instance, kind)
+        adjustment = self.adjustments.get(key, None)
+        if adjustment and adjustment.handle is None:
+            del self.adjustments[key]
+
+    def cancel(self, key):
+        adjustment = self.adjustments.pop(key, None)
+        if adjustment and adjustment.handle is not None:
+            adjustment.handle.cancel()
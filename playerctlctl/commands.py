@@ -1,5 +1,7 @@
 from gi.repository import Playerctl
 
+from .utils import get_player_instance
+
 STR_TO_LOOP_STATUS = {
     e.value_nick.lower(): e
     for e in Playerctl.LoopStatus.__enum_values__.values()
@@ -17,7 +19,8 @@ def require_player(method):
 class Commands:
     def __init__(self, daemon, event_cb=None):
         self.daemon = daemon
-        self.player = daemon.core.current_player
+        self.player = daemon.core.guard_player(daemon.core.current_player)
+        self.instance = get_player_instance(daemon.core.current_player)
         self.event_cb = event_cb
 
     @require_player
@@ -25,7 +28,10 @@ class Commands:
         """
         Gets the position of the player in seconds
         """
-        return self.player.get_position() / 1000000
+        position = self.daemon.adjustments.get((self.instance, 'position'))
+        if position is None:
+            position = self.player.get_position()
+        return position / 1000000
 
     @require_player
     def set_position(self, offset, absolute=True):
@@ -34,21 +40,34 @@ class Commands:
 
         offset -- the time in seconds to set/shift the position by
         absolute -- if true, offset is the exact position
-            if false, offset is relative to the current position
+            if false, offset is relative to the current position,
+            shifts that arrive close together are applied as a single seek
         """
         offset *= 1000000
+        key = (self.instance, 'position')
         if absolute:
+            self.daemon.adjustments.cancel(key)
             self.player.set_position(offset)
-        else:
-           self.player.set_position(self.player.get_position() + offset)
-        return self.get_position()
+            return self.get_position()
+        position = self.daemon.adjustments.adjust(
+            key, offset,
+            self.player.get_position, self.player.set_position,
+            minimum=0,
+            # Keep the target moving with playback while the key is held
+            read_rate=lambda: 1000000 if self.get_status() == 'playing' else 0,
+            read_maximum=lambda: self.get_all_metadata().get('mpris:length', None) or None
+        )
+        return position / 1000000
 
     @require_player
     def get_volume(self):
         """
         Gets the volume of the player
         """
-        return self.player.props.volume
+        volume = self.daemon.adjustments.get((self.instance, 'volume'))
+        if volume is None:
+            volume = self.player.props.volume
+        return volume
 
     @require_player
     def set_volume(self, level, absolute=True):
@@ -57,13 +76,19 @@ class Commands:
 
         volume -- the amount in fractional percent to set/shift the volume by
         absolute -- if true, the volume is set to this number
-            if false, the volume is set relative to the current volume
+            if false, the volume is set relative to the current volume,
+            shifts that arrive close together are applied as a single change
         """
+        key = (self.instance, 'volume')
         if absolute:
+            self.daemon.adjustments.cancel(key)
             self.player.set_volume(level)
-        else:
-            self.player.set_volume(self.player.props.volume + level)
-        return self.get_volume()
+            return self.get_volume()
+        return self.daemon.adjustments.adjust(
+            key, level,
+            lambda: self.player.props.volume, self.player.set_volume,
+            minimum=0
+        )
 
     @require_player
     def get_status(self):
@@ -150,9 +175,9 @@ class Commands:
         """
         Gets the instance of the current player
         """
-        if not self.player:
-            return ''
-        return self.player.get_property('player-instance')
+        # Read from the unguarded player, this doesn't go over D-Bus
+        # and should still work if the player is not responding
+        return get_player_instance(self.daemon.core.current_player)
 
     def ctl_get_name(self):
         """
@@ -160,7 +185,7 @@ class Commands:
         """
         if not self.player:
             return ''
-        return self.player.get_property('player-name')
+        return self.daemon.core.current_player.get_property('player-name')
 
     def ctl_subscribe(self):
         """
@@ -169,5 +194,34 @@ class Commands:
         self.daemon.event_listeners.add(self.event_cb)
         return True
 
+    def ctl_subscribe_format(self, template, width=0):
+        """
+        Subscribes to status lines rendered by the daemon,
+        a line is only sent when it differs from the previous one
+
+        template -- a format string, which can use the fields
+            {instance}, {player}, {status}, {artist}, {title}, {track},
+            {position}, {length}, and {volume}
+            (ie "{track} [{position}/{length}]")
+        width -- the length to clip/pad lines to (at least 4), 0 to leave them as-is
+
+        Returns an id which is sent with each line, so that a connection
+        with more than one format subscription can tell them apart
+        """
+        return self.daemon.formats.subscribe(template, width, self.event_cb)
+
+    def ctl_get_event_stats(self):
+        """
+        Gets the number of events published and how many times the
+        event loop had to be woken up to deliver them
+        """
+        published = self.daemon.events_published
+        wakeups = self.daemon.event_wakeups
+        return {
+            'events': published,
+            'wakeups': wakeups,
+            'events_per_wakeup': published / wakeups if wakeups else 0
+        }
+
     def ctl_raise(self):
         raise RuntimeError('test error please ignore')
\ No newline at end of file
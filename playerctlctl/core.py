@@ -5,6 +5,8 @@ Daemon core, contains the glib event loop
 """
 
 import logging
+import threading
+import concurrent.futures
 from functools import partial
 
 import gi
@@ -12,6 +14,7 @@ gi.require_version('Playerctl', '2.0')
 from gi.repository import Playerctl, GLib
 
 from .utils import get_player_instance, is_player_active
+from .health import PlayerHealth, GuardedPlayer
 
 logger = logging.getLogger('core')
 
@@ -19,13 +22,115 @@ PLAYER_SIGNALS = (
     'loop-status', 'metadata', 'seeked', 'shuffle', 'volume'
 )
 
+# Seconds to wait for a player to answer a call
+CALL_TIMEOUT = 1
+# Consecutive timeouts before a player is considered unresponsive
+TRIP_THRESHOLD = 3
+# Seconds between checks on whether an unresponsive player has recovered
+PROBE_INTERVAL = 5
+
 class Core:
-    def __init__(self, publish_event_callback):
+    def __init__(
+        self,
+        publish_event_callback,
+        call_timeout=CALL_TIMEOUT,
+        trip_threshold=TRIP_THRESHOLD,
+        probe_interval=PROBE_INTERVAL,
+        trace_recorder=None
+    ):
         self.current_player_index = 0
         self.current_player = None
         self.signal_handlers = []
         self.player_manager = None
         self.publish_event_callback = publish_event_callback
+        self.call_timeout = call_timeout
+        self.trip_threshold = trip_threshold
+        self.probe_interval = probe_interval
+        self.player_health = {}
+        self.health_lock = threading.Lock()
+        self.trace_recorder = trace_recorder
+
+    def record_signal(self, signal, player, *data):
+        if self.trace_recorder:
+            self.trace_recorder.record(signal, get_player_instance(player), *data)
+
+    def get_player_health(self, player):
+        instance = get_player_instance(player)
+        with self.health_lock:
+            health = self.player_health.get(instance, None)
+            if not health:
+                health = PlayerHealth(instance)
+                self.player_health[instance] = health
+            return health
+
+    def is_player_tripped(self, player):
+        health = self.player_health.get(get_player_instance(player), None)
+        return bool(health and health.tripped)
+
+    def guard_player(self, player):
+        if not player:
+            return None
+        return GuardedPlayer(self, player)
+
+    def call_player(self, player, func, *args, **kwargs):
+        health = self.get_player_health(player)
+        if health.tripped:
+            raise RuntimeError(f'Player {health.instance} is not responding')
+        try:
+            ret = health.call(self.call_timeout, func, *args, **kwargs)
+        except concurrent.futures.TimeoutError:
+            health.failures += 1
+            logger.debug(f'Call to {health.instance} timed out ({health.failures} in a row)')
+            if health.failures >= self.trip_threshold:
+                self.trip_player(player, health)
+            raise RuntimeError(
+                f'Player {health.instance} did not respond within {self.call_timeout}s'
+            )
+        health.failures = 0
+        return ret
+
+    def trip_player(self, player, health):
+        logger.info(f'Player {health.instance} is not responding')
+        health.tripped = True
+        health.probe_source_id = GLib.timeout_add_seconds(
+            self.probe_interval, self.probe_player, player, health
+        )
+        self.publish_event_callback('ctl_player_unresponsive', instance=health.instance)
+
+        if player == self.current_player:
+            replacement = self.find_first_active_player() or self.find_first_healthy_player()
+            if replacement:
+                self.set_current_player(replacement)
+
+    def probe_player(self, player, health):
+        if self.player_health.get(health.instance, None) is not health:
+            return False
+        # The probe runs on the player's own worker, so it only finishes once
+        # any hung calls ahead of it have too
+        if health.probe is None:
+            health.probe = health.executor.submit(player.get_position)
+            return True
+        if not health.probe.done():
+            return True
+
+        logger.info(f'Player {health.instance} has recovered')
+        health.probe = None
+        health.probe_source_id = None
+        health.failures = 0
+        health.tripped = False
+        self.publish_event_callback('ctl_player_recovered', instance=health.instance)
+        if self.current_player is None:
+            self.set_current_player(player)
+        return False
+
+    def forget_player(self, player):
+        with self.health_lock:
+            health = self.player_health.pop(get_player_instance(player), None)
+        if not health:
+            return
+        if health.probe_source_id is not None:
+            GLib.source_remove(health.probe_source_id)
+        health.close()
 
     def set_current_player(self, player):
         prev_player = self.current_player
@@ -63,16 +168,32 @@ class Core:
         players = self.player_manager.props.players
         if not players:
             return None
-        new_index = (self.current_player_index + amount) % len(players)
+        new_index = self.current_player_index
+        for _ in players:
+            new_index = (new_index + amount) % len(players)
+            if not self.is_player_tripped(players[new_index]):
+                break
+        else:
+            return get_player_instance(self.current_player)
         self.set_current_player(players[new_index])
         return get_player_instance(self.current_player)
 
+    def find_first_healthy_player(self):
+        return next(
+            (
+                player
+                for player in self.player_manager.props.players
+                if not self.is_player_tripped(player)
+            ),
+            None
+        )
+
     def find_first_active_player(self):
         return next(
             (
                 player
                 for player in self.player_manager.props.players
-                if is_player_active(player)
+                if not self.is_player_tripped(player) and is_player_active(player)
             ),
             None
         )
@@ -88,9 +209,11 @@ class Core:
         for i, v in enumerate(args):
             if hasattr(v, 'unpack'):
                 args[i] = v.unpack()
+        self.record_signal('signal', player, event, *args)
         self.publish_event_callback(event, data=args)
 
     def on_playback_state_change(self, player, state):
+        self.record_signal('playback-status', player, state.value_nick)
         if player == self.current_player:
             self.publish_event_callback('playback-status', data=[state.value_nick])
         if is_player_active(self.current_player):
@@ -104,12 +227,20 @@ class Core:
 
     def on_player_appeared(self, manager, player):
         logger.debug(f'Player added: {get_player_instance(player)}')
+        if self.trace_recorder:
+            self.record_signal(
+                'player-appeared', player,
+                player.get_property('player-name'),
+                player.get_property('playback-status').value_nick
+            )
         players = self.player_manager.props.players
 
         # Switch to new player if it's active
         active_player = self.find_first_active_player()
         if self.current_player is None:
-            self.set_current_player(active_player or players[0])
+            self.set_current_player(
+                active_player or self.find_first_healthy_player() or players[0]
+            )
             return
         if not is_player_active(self.current_player) and active_player:
             self.set_current_player(active_player)
@@ -118,6 +249,8 @@ class Core:
 
     def on_player_vanished(self, manager, player):
         logger.debug(f'Player vanished: {get_player_instance(player)}')
+        self.record_signal('player-vanished', player)
+        self.forget_player(player)
         players = self.player_manager.props.players
 
         if player != self.current_player:
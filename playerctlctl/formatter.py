@@ -0,0 +1,219 @@
+"""
+A daemon to make controlling multiple players easier.
+
+Renders status lines from templates, for subscribers that don't want to
+make their own requests (ie shell scripts reading from socat)
+"""
+
+import asyncio
+import itertools
+import logging
+
+logger = logging.getLogger('formatter')
+
+# Seconds between re-renders while playing, so the position keeps updating without events
+REFRESH_INTERVAL = 1
+
+# Events that can change a rendered line, others (ie loop-status) don't need a render
+STATE_EVENTS = {
+    'ctl_player_change', 'ctl_player_unresponsive', 'ctl_player_recovered',
+    'playback-status', 'metadata', 'seeked', 'volume',
+}
+
+EXAMPLE_STATE = {
+    'instance': 'player',
+    'player': 'player',
+    'status': 'playing',
+    'artist': 'artist',
+    'title': 'title',
+    'track': 'artist - title',
+    'position': '00:00',
+    'length': '00:00',
+    'volume': '100',
+}
+
+
+# format_time, ljust_clip and get_trackname mirror the helpers in
+# bar_status/outputter.py, change them together. bar_status keeps its own
+# copy because it runs without this package (importing it pulls in gi and
+# the daemon), and the daemon shouldn't depend on one of its clients
+
+def format_time(seconds):
+    if seconds is None:
+        return '--:--'
+    prefix = '-' if seconds < 0 else ''
+    hours, rem = divmod(round(abs(seconds)), 3600)
+    minutes, seconds = divmod(rem, 60)
+    if hours:
+        return f'{prefix}{hours:02}:{minutes:02}:{seconds:02}'
+    return f'{prefix}{minutes:02}:{seconds:02}'
+
+
+def ljust_clip(string, n):
+    if len(string) > n:
+        return string[:n-3] + '...'
+    return string.ljust(n)
+
+
+def get_trackname(metadata):
+    title = metadata.get('xesam:title', '')
+    artist = metadata.get('xesam:artist', '')
+    url = metadata.get('xesam:url', '')
+
+    if not title:
+        return url.split('/')[-1]
+    if not artist:
+        return title
+    if isinstance(artist, list):
+        artist = ', '.join(artist)
+
+    return f'{artist} - {title}'
+
+
+def get_state(commands):
+    """
+    Gets the values that can be used in a template from the current player,
+    or None if there isn't one
+    """
+    if not commands.player:
+        return None
+    try:
+        metadata = commands.get_all_metadata()
+        status = commands.get_status()
+    except Exception as e:
+        logger.debug(f'Failed to get player state: {e}')
+        return None
+
+    try:
+        position = commands.get_position()
+    except Exception:
+        position = None
+    # Every field is a string, so templates that pass the check in
+    # subscribe can't fail on a missing value
+    try:
+        volume = str(round(commands.get_volume() * 100))
+    except Exception:
+        volume = ''
+
+    artist = metadata.get('xesam:artist', '')
+    if isinstance(artist, list):
+        artist = ', '.join(artist)
+    length = metadata.get('mpris:length', 0) / 1000000
+
+    return {
+        'instance': commands.ctl_get_instance(),
+        'player': commands.ctl_get_name(),
+        'status': status,
+        'artist': artist,
+        'title': metadata.get('xesam:title', ''),
+        'track': get_trackname(metadata),
+        'position': format_time(position),
+        'length': format_time(length or None),
+        'volume': volume,
+    }
+
+
+def render(template, width, state):
+    line = template.format(**state) if state else ''
+    if width:
+        line = ljust_clip(line, width)
+    return line
+
+
+class FormatGroup:
+    def __init__(self, group_id, template, width):
+        self.id = group_id
+        self.template = template
+        self.width = width
+        self.listeners = set()
+        self.last_line = None
+
+
+class FormatSubscriptions:
+    """
+    Subscribers with the same template and width share a group,
+    which is rendered once per state change
+    """
+    def __init__(self, get_state_callback):
+        self.get_state_callback = get_state_callback
+        self.groups = {}
+        self.last_status = None
+        self.group_ids = itertools.count(1)
+        # Keep references to tasks so they aren't garbage collected before running
+        self.tasks = set()
+
+    def create_task(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def subscribe(self, template, width, listener):
+        """
+        Adds listener to the group for template and width,
+        returns the group's id which is sent with each line
+        """
+        if width and width < 4:
+            raise RuntimeError('Invalid width: must be 0 or at least 4')
+        try:
+            render(template, width, EXAMPLE_STATE)
+        except (KeyError, IndexError, ValueError) as e:
+            raise RuntimeError(f'Invalid template: {e!r}')
+
+        key = (template, width)
+        group = self.groups.get(key, None)
+        if not group:
+            group = FormatGroup(next(self.group_ids), template, width)
+            self.groups[key] = group
+        group.listeners.add(listener)
+
+        if group.last_line is None:
+            self.create_task(self.publish())
+        else:
+            self.create_task(listener('ctl_format', id=group.id, line=group.last_line))
+        return group.id
+
+    def unsubscribe(self, listener):
+        for key, group in list(self.groups.items()):
+            group.listeners.discard(listener)
+            if not group.listeners:
+                logger.debug(f'Removed format group {group.template!r}')
+                del self.groups[key]
+
+    async def publish(self):
+        if not self.groups:
+            return
+        state = self.get_state_callback()
+        self.last_status = state['status'] if state else None
+        await asyncio.gather(
+            *(self.publish_group(group, state) for group in list(self.groups.values()))
+        )
+
+    async def publish_group(self, group, state):
+        line = render(group.template, group.width, state)
+        if line == group.last_line:
+            return
+        group.last_line = line
+
+        listeners = list(group.listeners)
+        listener_statuses = await asyncio.gather(
+            *(listener('ctl_format', id=group.id, line=line) for listener in listeners)
+        )
+        group.listeners -= {
+            listener
+            for listener, is_valid in zip(listeners, listener_statuses)
+            if not is_valid
+        }
+        if not group.listeners:
+            logger.debug(f'Removed format group {group.template!r}')
+            self.groups.pop((group.template, group.width), None)
+
+    async def refresh_loop(self):
+        while 1:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            # Only the position changes without an event, and only while playing
+            if self.last_status != 'playing':
+                continue
+            try:
+                await self.publish()
+            except Exception as e:
+                logger.warning(f'Failed to publish formatted lines: {e}')
@@ -0,0 +1,68 @@
+"""
+A daemon to make controlling multiple players easier.
+
+Per-player call deadlines, so that a player which stops answering D-Bus
+can't stall the whole daemon
+"""
+
+import concurrent.futures
+
+
+class PlayerHealth:
+    def __init__(self, instance):
+        self.instance = instance
+        # One worker per player, so a hung call only queues up calls to the same player
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f'player-{instance}'
+        )
+        self.failures = 0
+        self.tripped = False
+        self.probe = None
+        self.probe_source_id = None
+
+    def call(self, timeout, func, *args, **kwargs):
+        """
+        Runs func on this player's worker thread, raising
+        concurrent.futures.TimeoutError if it doesn't return in time
+        """
+        fut = self.executor.submit(func, *args, **kwargs)
+        try:
+            return fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Don't leave the call queued behind a hung one, the caller has
+            # already been told it failed
+            fut.cancel()
+            raise
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class GuardedProps:
+    def __init__(self, core, player):
+        self._core = core
+        self._player = player
+
+    def __getattr__(self, name):
+        return self._core.call_player(self._player, getattr, self._player.props, name)
+
+
+class GuardedPlayer:
+    """
+    Wraps a Playerctl.Player so that every method call and property read
+    goes through Core.call_player
+    """
+    def __init__(self, core, player):
+        self._core = core
+        self._player = player
+        self.props = GuardedProps(core, player)
+
+    def __getattr__(self, name):
+        attr = getattr(self._player, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            return self._core.call_player(self._player, attr, *args, **kwargs)
+        return wrapper
@@ -0,0 +1,235 @@
+"""
+A daemon to make controlling multiple players easier.
+
+Records the signals received by the core to a file, and replays them into
+the core and daemon without a D-Bus connection, so that real player
+behaviour can be used as a repeatable benchmark.
+
+Usage: python -m playerctlctl.trace TRACE_FILE [SPEED]
+(a SPEED of 0 replays the trace as fast as possible)
+"""
+
+import sys
+import json
+import time
+import asyncio
+import tracemalloc
+from types import SimpleNamespace
+
+from gi.repository import Playerctl
+
+from . import Daemon
+
+STR_TO_PLAYBACK_STATUS = {
+    e.value_nick.lower(): e
+    for e in Playerctl.PlaybackStatus.__enum_values__.values()
+}
+
+
+class TraceRecorder:
+    """
+    Writes one JSON array per signal: [seconds since start, signal, instance, *data]
+    """
+    def __init__(self, path):
+        self.file = open(path, 'w', buffering=1)
+        self.start_time = time.monotonic()
+
+    def record(self, signal, instance, *data):
+        t = round(time.monotonic() - self.start_time, 3)
+        self.file.write(
+            json.dumps([t, signal, instance, *data], separators=(',', ':'), default=str)
+        )
+        self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class FakePlayer:
+    def __init__(self, instance, name, status):
+        self.properties = {
+            'player-instance': instance,
+            'player-name': name,
+            'playback-status': status,
+        }
+        self.handler_count = 0
+
+    def get_property(self, name):
+        return self.properties[name]
+
+    def connect(self, signal_name, callback):
+        self.handler_count += 1
+        return self.handler_count
+
+    def disconnect(self, handler_id):
+        pass
+
+
+class FakePlayerManager:
+    def __init__(self):
+        self.props = SimpleNamespace(players=[])
+
+
+def feed_signal(core, manager, players, signal, instance, data):
+    """
+    Calls the core's handler for a record,
+    returns False if it was skipped because of a different player selection
+    """
+    if signal == 'player-appeared':
+        name, status = data
+        player = FakePlayer(instance, name, STR_TO_PLAYBACK_STATUS[status.lower()])
+        players[instance] = player
+        manager.props.players.append(player)
+        core.on_player_appeared(manager, player)
+        return True
+
+    player = players.get(instance, None)
+    if not player:
+        return True
+
+    if signal == 'player-vanished':
+        del players[instance]
+        manager.props.players.remove(player)
+        core.on_player_vanished(manager, player)
+    elif signal == 'playback-status':
+        status = STR_TO_PLAYBACK_STATUS[data[0].lower()]
+        player.properties['playback-status'] = status
+        core.on_playback_state_change(player, status)
+    elif signal == 'signal':
+        # The core only receives these from its current player, if the replay
+        # picked a different one than the recording did then drop them
+        if player != core.current_player:
+            return False
+        core.on_current_player_signal(data[0], player, *data[1:])
+    return True
+
+
+def feed_trace(core, records, speed):
+    """
+    Calls the core's signal handlers for each record,
+    sleeping between them to match the recorded timing divided by speed.
+    Returns the seconds spent in the handlers (excluding the sleeps),
+    and the number of records that were skipped
+    """
+    players = {}
+    manager = core.player_manager
+    start_time = time.monotonic()
+    busy_time = 0
+    skipped = 0
+
+    for t, signal, instance, *data in records:
+        if speed:
+            delay = start_time + t / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        signal_start_time = time.perf_counter()
+        if not feed_signal(core, manager, players, signal, instance, data):
+            skipped += 1
+        busy_time += time.perf_counter() - signal_start_time
+
+    return busy_time, skipped
+
+
+async def replay(path, speed=1):
+    """
+    Replays a trace through the core and the daemon's event pipeline,
+    returns a dict of stats about the run
+    """
+    records = read_trace(path)
+
+    daemon = Daemon(None)
+    daemon.setup()
+    daemon.core.player_manager = FakePlayerManager()
+
+    delivered = 0
+    expected = None
+    all_delivered = asyncio.Event()
+    decisions = []
+
+    async def listener(event, **kwargs):
+        nonlocal delivered
+        delivered += 1
+        if event == 'ctl_player_change':
+            decisions.append(kwargs['instance'])
+        if expected is not None and delivered >= expected:
+            all_delivered.set()
+        return True
+
+    daemon.event_listeners.add(listener)
+
+    # Time spent delivering events, to measure the publisher separately from the core
+    publish_time = 0
+    publish_to_listeners = daemon.publish_to_listeners
+
+    async def timed_publish_to_listeners(event, kwargs):
+        nonlocal publish_time
+        publish_start_time = time.perf_counter()
+        await publish_to_listeners(event, kwargs)
+        publish_time += time.perf_counter() - publish_start_time
+
+    daemon.publish_to_listeners = timed_publish_to_listeners
+    event_publisher = asyncio.create_task(daemon.event_publisher_loop())
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        busy_time, skipped = await asyncio.to_thread(
+            feed_trace, daemon.core, records, speed
+        )
+        # The feed thread is done, so no more events can be published
+        expected = daemon.events_published
+        if delivered < expected:
+            await all_delivered.wait()
+        elapsed = time.perf_counter() - start_time
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        event_publisher.cancel()
+
+    return {
+        'signals': len(records),
+        'seconds': elapsed,
+        'busy_seconds': busy_time,
+        # Measured without the pacing sleeps, so it's comparable between speeds
+        'signals_per_second': len(records) / busy_time if busy_time else 0,
+        'skipped_signals': skipped,
+        'events': daemon.events_published,
+        'publish_seconds': publish_time,
+        'events_per_second': delivered / publish_time if publish_time else 0,
+        'wakeups': daemon.event_wakeups,
+        'player_changes': decisions,
+        'peak_memory': peak_memory,
+    }
+
+
+def main(argv):
+    if len(argv) < 2:
+        print(f'Usage: python -m playerctlctl.trace TRACE_FILE [SPEED]', file=sys.stderr)
+        return 1
+    speed = float(argv[2]) if len(argv) > 2 else 1
+
+    stats = asyncio.run(replay(argv[1], speed))
+    wakeups = stats['wakeups']
+    print(f'Signals:        {stats["signals"]} in {stats["seconds"]:.3f}s')
+    print(f'Core time:      {stats["busy_seconds"]:.3f}s '
+          f'({stats["signals_per_second"]:.0f} signals/s)')
+    print(f'Skipped:        {stats["skipped_signals"]} signal(s) from a non-current player')
+    print(f'Events:         {stats["events"]} over {wakeups} wakeup(s) '
+          f'({stats["events"] / wakeups if wakeups else 0:.1f}/wakeup)')
+    print(f'Publish time:   {stats["publish_seconds"]:.3f}s '
+          f'({stats["events_per_second"]:.0f} events/s)')
+    print(f'Player changes: {len(stats["player_changes"])}')
+    for instance in stats['player_changes']:
+        print(f'  -> {instance or "(none)"}')
+    print(f'Peak memory:    {stats["peak_memory"] / 1024:.1f} KiB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))